@@ -0,0 +1,229 @@
+"""
+Find duplicate files among many millions of paths, see `--compact' in bin/fdupes.
+
+Paths and stat results are kept in a compact `FileTable' and files are only
+ever referred to by their index into it so memory use doesn't grow with the
+number of Python objects per path.
+"""
+import array
+import collections
+import itertools
+import os
+
+from .file_hash import BLOCK_SIZE, HASHES, get_hash, get_partial_hash, partial_read_size
+
+_Stat = collections.namedtuple("_Stat", ["st_dev", "st_ino", "st_size", "st_mtime_ns"])
+
+
+class FileTable:  # pylint: disable=too-many-instance-attributes
+    """Compact store for the paths and stat results of a large number of files.
+
+    Directory prefixes are interned so every file in a directory shares one
+    copy of it, basenames are packed into one bytearray and stat fields are
+    kept in typed arrays. Files are referred to by their integer index into
+    the table.
+    """
+
+    def __init__(self):
+        self._dirs = []
+        self._dir_ids = {}
+        self._path_dirs = array.array("L")
+        self._names = bytearray()
+        self._name_offsets = array.array("Q", [0])
+        self.dev = array.array("Q")
+        self.ino = array.array("Q")
+        self.size = array.array("q")
+        self.mtime_ns = array.array("q")
+
+    def __len__(self):
+        return len(self._path_dirs)
+
+    def path(self, i):
+        """The path of the file at index `i'."""
+        start, end = self._name_offsets[i], self._name_offsets[i + 1]
+        basename = os.fsdecode(bytes(self._names[start:end]))
+        return self._dirs[self._path_dirs[i]] + basename
+
+    def stat(self, i):
+        """The stat result of the file at index `i'."""
+        return _Stat(self.dev[i], self.ino[i], self.size[i], self.mtime_ns[i])
+
+    def append(self, path, st):
+        """Add `path', with stat result `st', to the table."""
+        dirname, sep, basename = path.rpartition(os.sep)
+        dirname += sep
+        dir_id = self._dir_ids.get(dirname)
+        if dir_id is None:
+            dir_id = self._dir_ids[dirname] = len(self._dirs)
+            self._dirs.append(dirname)
+        self._path_dirs.append(dir_id)
+        self._names += os.fsencode(basename)
+        self._name_offsets.append(len(self._names))
+        self.dev.append(st.st_dev)
+        self.ino.append(st.st_ino)
+        self.size.append(st.st_size)
+        self.mtime_ns.append(st.st_mtime_ns)
+
+
+def _runs(ids, key):
+    """Enumerate runs of consecutive `ids' with the same `key'."""
+    for _, run in itertools.groupby(ids, key=key):
+        yield list(run)
+
+
+class CompactGrouper:
+    """Group the files in a `FileTable' by duplicates, see `gen_dups' in bin/fdupes.
+
+    Files are hashed and verified by `pipeline', the `_Pipeline' of fdupes, and
+    are only ever referred to by their index into the table. Stages pass
+    candidates along in arrays sorted by size, so grouping by digest only ever
+    needs to look at one size at a time.
+    """
+
+    def __init__(self, table, pipeline):
+        self.table = table
+        self.pipeline = pipeline
+        self.stats = pipeline.stats
+        # Files that aren't yielded on their own, because they failed to hash, are
+        # repeats of an earlier path or are part of a group of duplicates.
+        self.hidden = bytearray(len(table))
+
+    def _drop_repeats(self, run):
+        """Remove any path repeated in `run', a list of files of the same size."""
+        table, unique, inodes = self.table, [], {}
+        for i in run:
+            links = inodes.setdefault((table.dev[i], table.ino[i]), [])
+            if any(table.path(j) == table.path(i) for j in links):
+                self.hidden[i] = 1
+            else:
+                links.append(i)
+                unique.append(i)
+        return unique
+
+    def size_stage(self):
+        """Find the files that share their size with another file, sorted by size.
+
+        Files are counting sorted into slots by a hash of their size, so sizes only
+        need to be compared between the few files that land in the same slot.
+        """
+        table, stats = self.table, self.stats
+        stats.files["size"] += len(table)
+        slots = 1 << max(len(table).bit_length() - 1, 0)
+
+        def slot(i):
+            return (table.size[i] * 0x9E3779B97F4A7C15 >> 32) & (slots - 1)
+
+        # Count the files in each slot and turn that into the offset of each slot
+        # in `order'. Filling `order' moves each offset to the end of its slot.
+        offsets = array.array("L", [0]) * (slots + 1)
+        for i in range(len(table)):
+            offsets[slot(i) + 1] += 1
+        for s in range(slots):
+            offsets[s + 1] += offsets[s]
+        order = array.array("L", [0]) * len(table)
+        for i in range(len(table)):
+            order[offsets[slot(i)]] = i
+            offsets[slot(i)] += 1
+
+        candidates = array.array("L")
+        start = 0
+        for end in offsets[:slots]:
+            ids = sorted(order[start:end], key=table.size.__getitem__)
+            start = end
+            for run in _runs(ids, table.size.__getitem__):
+                if len(run) > 1:
+                    run = self._drop_repeats(run)
+                if len(run) > 1:
+                    candidates.extend(run)
+                elif self.pipeline.readable(table.path(run[0])):
+                    stats.avoided["size"] += table.size[run[0]]
+                else:
+                    self.hidden[run[0]] = 1
+        return candidates
+
+    def digest_stage(self, ids, stage, hasher, read_size):
+        """Hash every file in `ids', sorted by size, yielding the groups of files
+        with the same size and digest.
+        """
+        table, pipeline = self.table, self.pipeline
+        width = HASHES[pipeline.algorithm]().digest_size
+        digests = bytearray(len(ids) * width)
+        hashed = bytearray(len(ids))
+        for pos, digest in pipeline.iter_hash_stage(
+            range(len(ids)),
+            stage,
+            lambda pos: hasher(ids[pos]),
+            lambda pos: table.stat(ids[pos]),
+            read_size,
+        ):
+            digests[pos * width : (pos + 1) * width] = digest
+            hashed[pos] = 1
+
+        for run in _runs(range(len(ids)), lambda pos: table.size[ids[pos]]):
+            groups = {}
+            for pos in run:
+                if hashed[pos]:
+                    digest = bytes(digests[pos * width : (pos + 1) * width])
+                    groups.setdefault(digest, []).append(ids[pos])
+                else:
+                    self.hidden[ids[pos]] = 1
+            yield from groups.values()
+
+    def hash_stages(self, candidates):
+        """Split `candidates' by partial and then full digests.
+        Returns the groups of files that still need to be verified.
+        """
+        table, stats = self.table, self.stats
+        algorithm, strategy = self.pipeline.algorithm, self.pipeline.strategy
+        full_candidates = array.array("L")
+        verify_groups = []
+        for group in self.digest_stage(
+            candidates,
+            "partial",
+            lambda i: get_partial_hash(table.path(i), table.size[i], algorithm),
+            partial_read_size,
+        ):
+            size = table.size[group[0]]
+            if len(group) == 1:
+                stats.avoided["partial"] += size - partial_read_size(size)
+            elif size <= 2 * BLOCK_SIZE:
+                # The partial hash already covered the whole file.
+                verify_groups.append(group)
+            else:
+                full_candidates.extend(group)
+
+        verify_groups.extend(
+            self.digest_stage(
+                full_candidates,
+                "full",
+                lambda i: get_hash(table.path(i), algorithm, strategy),
+                lambda size: size,
+            )
+        )
+        return verify_groups
+
+    def verify_stage(self, verify_groups):
+        """Verify `verify_groups' returning a map from the first file in each group
+        of duplicates to the group.
+        """
+        table, stats = self.table, self.stats
+
+        def verify(group):
+            ids = {table.path(i): i for i in group}
+            group_stats = {fp: table.stat(i) for fp, i in ids.items()}
+            return self.pipeline.verifier(list(ids), group_stats), ids
+
+        groups = {}
+        for (path_groups, read, avoided), ids in self.pipeline.imap(
+            verify, verify_groups
+        ):
+            stats.files["verify"] += sum(map(len, path_groups))
+            stats.read["verify"] += read
+            stats.avoided["verify"] += avoided
+            for group in path_groups:
+                if len(group) > 1:
+                    group = sorted(ids[fp] for fp in group)
+                    groups[group[0]] = group
+                    for i in group[1:]:
+                        self.hidden[i] = 1
+        return groups
@@ -0,0 +1,140 @@
+"""
+Hash the contents of files quickly.
+
+Files can be hashed with any of the `HASHES` algorithms and read into them with
+any of the `STRATEGIES`. `benchmark` reports how fast each combination is on a
+given set of files.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import threading
+import time
+
+try:
+    import xxhash
+except ImportError:
+    HAS_XXHASH = False
+else:
+    HAS_XXHASH = True
+
+# Size of the buffer files are read into when hashing them.
+READ_BUFFER_SIZE = 2**20
+# Bytes read from the start and end of each file when partially hashing it.
+BLOCK_SIZE = 4096
+
+# Digest algorithms files can be hashed with.
+HASHES = {
+    "md5": hashlib.md5,
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+    "blake2b": hashlib.blake2b,
+    "blake2s": hashlib.blake2s,
+}
+if HAS_XXHASH:
+    HASHES["xxh64"] = xxhash.xxh64
+    HASHES["xxh3_128"] = xxhash.xxh3_128
+
+_thread_local = threading.local()
+
+
+def _read_buffer():
+    """A reusable read buffer for the current thread."""
+    try:
+        return _thread_local.buffer
+    except AttributeError:
+        _thread_local.buffer = memoryview(bytearray(READ_BUFFER_SIZE))
+        return _thread_local.buffer
+
+
+def _hash_read(fd, m, buf_size=8192):
+    """Update `m' with `fd' by reading it into a new bytes object at a time."""
+    data = fd.read(buf_size)
+    while data:
+        m.update(data)
+        data = fd.read(buf_size)
+    return m
+
+
+def _hash_readinto(fd, m):
+    """Update `m' with `fd' by reading it into one preallocated buffer."""
+    buf = _read_buffer()
+    size = fd.readinto(buf)
+    while size:
+        m.update(buf[:size])
+        size = fd.readinto(buf)
+    return m
+
+
+def _hash_mmap(fd, m):
+    """Update `m' with `fd' by memory mapping the whole file."""
+    try:
+        with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            m.update(mm)
+    except ValueError:
+        pass  # Empty files can't be mapped but there's nothing to hash.
+    return m
+
+
+def _hash_file_digest(fd, m):
+    """Update `m' with `fd' through `hashlib.file_digest'."""
+    return hashlib.file_digest(fd, lambda: m)
+
+
+# Strategies for reading a file into a hash object.
+STRATEGIES = {"read": _hash_read, "readinto": _hash_readinto, "mmap": _hash_mmap}
+if hasattr(hashlib, "file_digest"):
+    STRATEGIES["file_digest"] = _hash_file_digest
+
+
+def get_hash(fp, algorithm="md5", strategy="readinto"):
+    """Get the `algorithm' hash for the file at `fp' read using `strategy'."""
+    logging.debug("Getting hash for file: %s", fp)
+    with open(fp, "rb", buffering=0) as fd:
+        return STRATEGIES[strategy](fd, HASHES[algorithm]()).digest()
+
+
+def benchmark(paths, fd):
+    """Report the throughput of every hash and read strategy on `paths' to `fd'.
+    Each file is read once upfront so the results aren't skewed by whichever
+    strategy happens to run first against a cold page cache.
+    """
+    total = 0
+    for fp in paths:
+        total += os.stat(fp).st_size
+        get_hash(fp, "md5", "readinto")
+
+    for algorithm in HASHES:
+        for strategy in STRATEGIES:
+            start = time.perf_counter()
+            for fp in paths:
+                get_hash(fp, algorithm, strategy)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{algorithm:<10} {strategy:<12} "
+                f"{total / 2**20 / max(elapsed, 1e-9):10.1f} MB/s",
+                file=fd,
+            )
+
+
+def get_partial_hash(fp, size, algorithm="md5", block_size=BLOCK_SIZE):
+    """Get a hash of the first and last `block_size' bytes of `fp'.
+    When the file is no larger than two blocks this is just a hash
+    of the whole file.
+    """
+    logging.debug("Getting partial hash for file: %s", fp)
+    m = HASHES[algorithm]()
+    with open(fp, "rb") as fd:
+        if size <= 2 * block_size:
+            m.update(fd.read())
+        else:
+            m.update(fd.read(block_size))
+            fd.seek(-block_size, os.SEEK_END)
+            m.update(fd.read(block_size))
+    return m.digest()
+
+
+def partial_read_size(size, block_size=BLOCK_SIZE):
+    """The number of bytes `get_partial_hash' reads for a file of `size'."""
+    return min(size, 2 * block_size)
@@ -0,0 +1,23 @@
+"""
+Helpers for running work across `concurrent.futures` pools.
+"""
+import collections
+
+
+def imap(func, iterable, pool=None, limit=1):
+    """Like `map' but runs `func' across the executor `pool' when given.
+    At most `limit' items are in flight at once so `iterable' is consumed
+    lazily and memory stays flat. Results are yielded in the same order as
+    `iterable' regardless of the order they complete in.
+    """
+    if pool is None:
+        yield from map(func, iterable)
+        return
+
+    pending = collections.deque()
+    for it in iterable:
+        pending.append(pool.submit(func, it))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
@@ -0,0 +1,80 @@
+"""
+Persistent index of the files in the watcher added directory.
+
+When the watcher adds a torrent it moves the file the torrent came from into the
+added directory under a name derived from the torrent hash. This index maps each
+hash straight to that file (relative to the added directory) so finding it again
+once the torrent completes doesn't require searching the whole added directory.
+
+The index is only a cache, a missing or stale entry should be handled by looking
+for the file directly and recording what was found.
+"""
+
+import pathlib
+import sqlite3
+from types import TracebackType
+from typing import Iterable, Optional, Tuple, Type
+
+from .backend import TorrentBackend
+
+
+def added_index_file(backend: TorrentBackend) -> pathlib.Path:
+    """Added directory index file for `backend`, kept beside the watcher config."""
+    return backend.config_dir() / "watcher-added.sqlite"
+
+
+class AddedIndex:
+    """Mapping from torrent hash to its file in the watcher added directory."""
+
+    # How long to wait for another process to finish writing to the index.
+    LOCK_TIMEOUT = 30
+
+    def __init__(self, path: pathlib.Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=self.LOCK_TIMEOUT)
+        with self._db:
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS added (
+                    hash TEXT PRIMARY KEY,
+                    path TEXT NOT NULL
+                )
+                """
+            )
+
+    def __enter__(self) -> "AddedIndex":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+    def get(self, hash_: str) -> Optional[pathlib.Path]:
+        """Path relative to the added directory of the file for `hash_`."""
+        row = self._db.execute(
+            "SELECT path FROM added WHERE hash = ?", (hash_,)
+        ).fetchone()
+        if row is None:
+            return None
+        return pathlib.Path(row[0])
+
+    def update(self, entries: Iterable[Tuple[str, pathlib.Path]]) -> None:
+        """Record the relative path of the file for each hash in `entries`."""
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO added (hash, path) VALUES (?, ?)",
+                ((hash_, str(path)) for hash_, path in entries),
+            )
+
+    def remove(self, hash_: str) -> None:
+        """Forget the file for `hash_`."""
+        with self._db:
+            self._db.execute("DELETE FROM added WHERE hash = ?", (hash_,))
+
+    def close(self) -> None:
+        """Close the index."""
+        self._db.close()
@@ -1,8 +1,8 @@
+import contextlib
 import enum
 import os
 import pathlib
-
-from . import clients
+from typing import Any, AsyncContextManager, Optional
 
 
 class TorrentBackend(enum.IntEnum):
@@ -42,6 +42,19 @@ class TorrentBackend(enum.IntEnum):
 
     def client(self):
         """Client for interacting with a torrent backend."""
+        # Imported here so scripts that never talk to the backend load quickly.
+        from . import clients  # pylint: disable=import-outside-toplevel
+
         if self == TorrentBackend.QBITTORRENT:
             return clients.QBittorrentDaemonClient(self.config_dir() / "client-settings.json")
         raise ValueError(f"torrent-backend={self} has no supported client")
+
+    def connect(self, client: Optional[Any] = None) -> AsyncContextManager[Any]:
+        """Async context for talking to the torrent backend.
+
+        When `client` is given it's used as is and left open afterwards, otherwise a
+        new client is created for the duration of the context.
+        """
+        if client is not None:
+            return contextlib.nullcontext(client)
+        return self.client()
@@ -1,7 +1,7 @@
 import abc
 import pathlib
 from types import TracebackType
-from typing import Any, Dict, Optional, Type
+from typing import Any, Dict, List, Optional, Type
 
 
 class _WatcherClientMixin(abc.ABC):
@@ -18,13 +18,41 @@ class _WatcherClientMixin(abc.ABC):
         translated_file: pathlib.Path,
         overrides: Dict[str, Any],
     ) -> Optional[str]:
-        """Add a torrent file to the client."""
+        """Add a torrent file to the client.
+
+        Returns the infohash of the added torrent or None if it couldn't be added.
+        """
 
     @abc.abstractmethod
     async def add_magnetlink(
         self, magnetlink: str, overrides: Dict[str, Any]
     ) -> Optional[str]:
-        """Add a magnetlink to the client."""
+        """Add a magnetlink to the client.
+
+        Returns the infohash of the added torrent or None if it couldn't be added.
+        """
+
+    async def add_torrents(
+        self,
+        files: List[pathlib.Path],
+        translated_files: List[pathlib.Path],
+        magnetlinks: List[str],
+        overrides: Dict[str, Any],
+    ) -> List[Optional[str]]:
+        """Add several torrent files and magnetlinks with the same `overrides`.
+
+        Returns the infohash (or None) for each of `files` followed by each of
+        `magnetlinks`. Clients which can add many torrents in one request should
+        override this, by default they're added one at a time.
+        """
+        hashes = []
+        for file, translated_file in zip(files, translated_files):
+            hashes.append(
+                await self.add_torrent(file, translated_file, dict(overrides))
+            )
+        for magnetlink in magnetlinks:
+            hashes.append(await self.add_magnetlink(magnetlink, dict(overrides)))
+        return hashes
 
 
 class _TorrentMoveMixin(abc.ABC):
@@ -1,25 +1,73 @@
+import asyncio
 import json
 import logging
 import pathlib
 from types import TracebackType
-from typing import Any, Dict, List, Optional, Type
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Type
 
+import aiohttp
 import qbittorrentapi as qbit
 import tenacity
+import yarl
 
-from .. import portutils
+from .. import infohash, portutils
 from ._base import TorrentClient
 
 
+class QBittorrentAPIError(Exception):
+    """A request to the qBittorrent WebAPI failed with an HTTP error status."""
+
+    def __init__(self, endpoint: str, status: int, text: str):
+        super().__init__(f"{endpoint} failed with status={status}: {text}")
+        self.endpoint = endpoint
+        self.status = status
+        self.text = text
+
+
+def _is_transient_error(ex: BaseException) -> bool:
+    """Assert whether a request that failed with `ex` is worth retrying."""
+    if isinstance(ex, QBittorrentAPIError):
+        return ex.status >= 500
+    return isinstance(ex, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+def _base_url(host: str, port: Optional[int]) -> yarl.URL:
+    """Root URL of the WebAPI for the qbittorrentapi style `host` and `port`."""
+    if "://" not in host:
+        host = "http://" + host
+    url = yarl.URL(host)
+    if port is not None and url.explicit_port is None:
+        url = url.with_port(port)
+    return url.with_path("/")
+
+
 class QBittorrentDaemonClient(TorrentClient):
-    """Client interface for a qbittorrent daemon."""
+    """Client interface for a qbittorrent daemon.
+
+    Requests go directly to the WebAPI through a single aiohttp session which is
+    opened on first use and closed when the client exits. All requests share its
+    keep-alive connection pool and login cookie.
+
+    The synchronous qbittorrentapi client is still available as `_client` for
+    callers that want the full API.
+    """
+
+    # Maximum number of concurrent connections to the WebAPI.
+    CONNECTION_LIMIT = 4
+    # Timeout for any one request to the WebAPI in seconds.
+    REQUEST_TIMEOUT = 30
+
     def __init__(self, config_file: pathlib.Path):
         with config_file.open("r", encoding="utf-8") as config_fd:
             config = json.loads(config_fd.read())
 
         self._client = qbit.Client(**config)
-        self._host = config.get("host", "localhost")
-        self._port = config.get("port", 8080)
+        self._url = _base_url(config.get("host", "localhost"), config.get("port", 8080))
+        self._username = config.get("username")
+        self._password = config.get("password")
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._login_lock = asyncio.Lock()
+        self._logged_in = False
 
     async def __aenter__(self) -> "QBittorrentDaemonClient":
         return self
@@ -30,45 +78,99 @@ class QBittorrentDaemonClient(TorrentClient):
         exc_val: Optional[BaseException],
         exc_tb: Optional[TracebackType],
     ) -> None:
-        pass
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            self._logged_in = False
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                base_url=self._url,
+                connector=aiohttp.TCPConnector(limit=self.CONNECTION_LIMIT),
+                # Accept the SID cookie even when the daemon is addressed by IP.
+                cookie_jar=aiohttp.CookieJar(unsafe=True),
+                timeout=aiohttp.ClientTimeout(total=self.REQUEST_TIMEOUT),
+            )
+        return self._session
+
+    async def _login(self) -> None:
+        """Start a new WebAPI session, shared by every subsequent request."""
+        session = self._get_session()
+        async with self._login_lock:
+            if self._logged_in:
+                return
+            logging.debug("Logging into qbittorrent as username=%s", self._username)
+            async with session.post(
+                "api/v2/auth/login",
+                data={"username": self._username, "password": self._password},
+            ) as resp:
+                text = await resp.text()
+                if resp.status != 200 or text == "Fails.":
+                    raise QBittorrentAPIError("auth/login", resp.status, text)
+            self._logged_in = True
+
+    @tenacity.retry(
+        stop=tenacity.stop_after_attempt(5),
+        wait=tenacity.wait_random_exponential(multiplier=0.5, max=5),
+        retry=tenacity.retry_if_exception(_is_transient_error),
+        reraise=True,
+    )
+    async def _request(self, endpoint: str, data: Any = None) -> str:
+        """POST `data` to the WebAPI `endpoint` and return the response text.
+
+        Connection failures and server errors are retried with exponential backoff.
+        If the session has expired (or was never started) it's logged in and the
+        request is repeated.
+        """
+        session = self._get_session()
+        if self._username is not None and not self._logged_in:
+            await self._login()
+
+        for attempt in range(2):
+            # Multipart form data can only be sent once, so rebuild it each time.
+            request_data = data() if callable(data) else data
+            async with session.post("api/v2/" + endpoint, data=request_data) as resp:
+                text = await resp.text()
+                if resp.status == 403 and attempt == 0 and self._username is not None:
+                    logging.debug("Session for qbittorrent expired, logging in again")
+                    self._logged_in = False
+                    await self._login()
+                    continue
+                if resp.status != 200:
+                    raise QBittorrentAPIError(endpoint, resp.status, text)
+                return text
+        raise QBittorrentAPIError(endpoint, 403, text)
 
     async def is_alive(self) -> bool:
-        return await portutils.is_alive(self._host, self._port)
+        return await portutils.is_alive(self._url.host, self._url.port)
 
     async def move(self, torrent_id: Any, dest: str) -> bool:
         try:
-            return await self._move2(torrent_id, dest)
-        except tenacity.RetryError:
+            await self._request(
+                "torrents/setLocation", {"hashes": str(torrent_id), "location": dest}
+            )
+        except (QBittorrentAPIError, aiohttp.ClientError, asyncio.TimeoutError):
             logging.exception(
                 'Failed to move torrent="%s" to dest="%s"', torrent_id, dest
             )
             return False
-
-    @tenacity.retry(
-        stop=tenacity.stop_after_attempt(5),
-        wait=tenacity.wait_random(min=1, max=5),
-        retry=(
-            tenacity.retry_if_not_exception_type(qbit.Forbidden403Error)
-            & tenacity.retry_if_not_exception_type(qbit.Conflict409Error)
-        )
-        | tenacity.retry_if_not_result(lambda res: res),
-    )
-    async def _move2(self, torrent_id: Any, dest: str) -> bool:
-        self._client.torrents_set_location(dest, torrent_id)
         return True
 
     @staticmethod
-    def _translate_overrides(overrides: Dict[str, Any]) -> Dict[str, Any]:
+    def _translate_overrides(overrides: Dict[str, Any]) -> Dict[str, str]:
+        overrides = dict(overrides)
         new_overrides = {}
 
         paused = False
         paused = overrides.pop("paused", paused)
-        new_overrides["is_paused"] = paused
+        # paused was renamed to stopped in qbittorrent v5.
+        new_overrides["paused"] = new_overrides["stopped"] = str(bool(paused)).lower()
 
         if "download-dir" in overrides:
-            new_overrides["save_path"] = overrides.pop("download-dir")
-            # Auto management bypasses the `save_path` option.
-            new_overrides["use_auto_torrent_management"] = False
+            new_overrides["savepath"] = overrides.pop("download-dir")
+            # Auto management bypasses the `savepath` option.
+            new_overrides["autoTMM"] = "false"
 
         if overrides.pop("bandwidthPriority", None):
             logging.warning(
@@ -93,84 +195,141 @@ class QBittorrentDaemonClient(TorrentClient):
         translated_file: pathlib.Path,
         overrides: Dict[str, Any],
     ) -> Optional[str]:
-        overrides = self._translate_overrides(overrides)
-        return self._add(torrent_files=str(file), **overrides)
+        return (await self.add_torrents([file], [translated_file], [], overrides))[0]
 
     async def add_magnetlink(
         self, magnetlink: str, overrides: Dict[str, Any]
     ) -> Optional[str]:
-        overrides = self._translate_overrides(overrides)
-        return self._add(urls=magnetlink, **overrides)
+        return (await self.add_torrents([], [], [magnetlink], overrides))[0]
 
-    def _add(self, *args, **kwargs) -> Optional[str]:
-        logging.debug("Adding torrent with args=%s kwargs=%s", repr(args), repr(kwargs))
-        try:
+    async def add_torrents(
+        self,
+        files: List[pathlib.Path],
+        translated_files: List[pathlib.Path],
+        magnetlinks: List[str],
+        overrides: Dict[str, Any],
+    ) -> List[Optional[str]]:
+        hashes: List[Optional[str]] = []
+        # Mapping from the hash of each torrent to submit to its name and contents.
+        torrents: Dict[str, Tuple[str, bytes]] = {}
+        for file in map(pathlib.Path, files):
             try:
-                last_torrent_hash = self._get_most_recently_added_torrent_hash()[0]
-            except IndexError:
-                last_torrent_hash = None
+                with file.open("rb") as fd:
+                    contents = fd.read()
+                hash_ = infohash.torrent_data_hash(contents)
+            except (OSError, ValueError):
+                logging.exception(
+                    "Failed to determine infohash of torrent file=%s", file
+                )
+                hashes.append(None)
+            else:
+                hashes.append(hash_)
+                torrents.setdefault(hash_, (file.name, contents))
 
-            if not self._add2(*args, **kwargs):
-                return None
+        # Mapping from the hash of each magnet link to submit to the link.
+        urls: Dict[str, str] = {}
+        for magnetlink in magnetlinks:
+            try:
+                hash_ = infohash.magnetlink_hash(magnetlink)
+            except ValueError:
+                logging.exception(
+                    "Failed to determine infohash of magnet=%s", magnetlink
+                )
+                hashes.append(None)
+            else:
+                hashes.append(hash_)
+                if hash_ not in torrents:
+                    urls.setdefault(hash_, magnetlink)
 
-            attempt = 1
-            while attempt <= 10:
-                attempt += 1
+        added = await self._add(torrents, urls, self._translate_overrides(overrides))
+        # A torrent repeated in the batch was only added for its first occurrence.
+        result: List[Optional[str]] = []
+        for hash_ in hashes:
+            result.append(hash_ if hash_ in added else None)
+            added.discard(hash_)
+        return result
 
-                recent_torrent_hashes = self._get_most_recently_added_torrent_hash(
-                    count=5
-                )
-                if last_torrent_hash is None:
-                    next_position = 0
-                else:
-                    try:
-                        last_torrent_hash_position = recent_torrent_hashes.index(
-                            last_torrent_hash
-                        )
-                    except ValueError:
-                        logging.error(
-                            "Failed to find last torrent hash=%s in current torrent list",
-                            last_torrent_hash,
-                        )
-                        continue
-                    else:
-                        next_position = last_torrent_hash_position - 1
-
-                if next_position < 0:
-                    continue
-                if next_position != 0:
-                    logging.warning(
-                        "Multiple candidate torrent hashes in recent torrent hash list"
-                    )
+    async def _torrent_hashes(self, hashes: Iterable[str]) -> Set[str]:
+        """Find which of `hashes` qbittorrent already has a torrent for."""
+        wanted = set(hashes)
+        text = await self._request("torrents/info", {"hashes": "|".join(wanted)})
+        return {it["hash"] for it in json.loads(text)} & wanted
 
-                return recent_torrent_hashes[next_position]
-        except tenacity.RetryError:
-            logging.exception(
-                "Failed to add torrent with args=%s kwargs=%s", repr(args), repr(kwargs)
+    async def _add(
+        self,
+        torrents: Dict[str, Tuple[str, bytes]],
+        urls: Dict[str, str],
+        overrides: Dict[str, str],
+    ) -> Set[str]:
+        """Submit `torrents` and `urls` in one request and find which were added.
+
+        Torrents qbittorrent already has are left out, the same way qbittorrent
+        refuses to add them one at a time, so every hash in the response belongs
+        to a torrent added by this request.
+        """
+        hashes = [*torrents, *urls]
+        if not hashes:
+            return set()
+        errors = (QBittorrentAPIError, aiohttp.ClientError, asyncio.TimeoutError)
+        try:
+            existing = await self._torrent_hashes(hashes)
+        except errors:
+            logging.exception("Failed to query torrents with hashes=%s", hashes)
+            return set()
+        if existing:
+            logging.error(
+                "qbittorrent already has torrents with hashes=%s", sorted(existing)
             )
-        return None
+            torrents = {k: v for k, v in torrents.items() if k not in existing}
+            urls = {k: v for k, v in urls.items() if k not in existing}
+            hashes = [*torrents, *urls]
+            if not hashes:
+                return set()
 
-    @tenacity.retry(
-        stop=tenacity.stop_after_attempt(5),
-        wait=tenacity.wait_random(min=1, max=5),
-        retry=(
-            tenacity.retry_if_not_exception_type(qbit.UnsupportedMediaType415Error)
-            & tenacity.retry_if_not_exception_type(qbit.TorrentFileNotFoundError)
-            & tenacity.retry_if_not_exception_type(qbit.TorrentFilePermissionError)
-        )
-        | tenacity.retry_if_not_result(lambda res: res),
-    )
-    def _add2(self, *args, **kwargs) -> bool:
-        return self._client.torrents_add(*args, **kwargs) == "Ok."
+        def form() -> aiohttp.FormData:
+            data = aiohttp.FormData(overrides)
+            if urls:
+                data.add_field("urls", "\n".join(urls.values()))
+            for name, contents in torrents.values():
+                data.add_field(
+                    "torrents",
+                    contents,
+                    filename=name,
+                    content_type="application/x-bittorrent",
+                )
+            return data
 
-    @tenacity.retry(
-        stop=tenacity.stop_after_attempt(5),
-        wait=tenacity.wait_random(min=1, max=5),
-    )
-    def _get_most_recently_added_torrent_hash(self, count: int = 1) -> List[str]:
-        torrents = self._client.torrents_info(
-            sort="added_on", limit=count, reverse=True
+        return await self._submit(hashes, form)
+
+    async def _submit(self, hashes: List[str], data: Any) -> Set[str]:
+        """Submit the torrents-add form `data` and find which of `hashes` was added."""
+        errors = (QBittorrentAPIError, aiohttp.ClientError, asyncio.TimeoutError)
+        logging.debug("Adding torrents with hashes=%s", hashes)
+        try:
+            text = await self._request("torrents/add", data)
+        except errors:
+            logging.exception("Failed to add torrents with hashes=%s", hashes)
+            return set()
+
+        # Newer WebAPI versions respond with a summary of the added torrents, older
+        # ones with "Fails." only when none of them could be added.
+        try:
+            failures = json.loads(text)["failure_count"]
+        except (ValueError, TypeError, KeyError):
+            failures = 0 if text == "Ok." else len(hashes)
+        if failures == 0:
+            return set(hashes)
+        if failures == len(hashes):
+            logging.error("qbittorrent refused torrents with hashes=%s", hashes)
+            return set()
+
+        logging.warning(
+            "qbittorrent refused %d of %d torrents, checking which were added",
+            failures,
+            len(hashes),
         )
-        if len(torrents) == 0:
-            raise ValueError("No torrents in qbittorrent")
-        return [it["hash"] for it in torrents]
+        try:
+            return await self._torrent_hashes(hashes)
+        except errors:
+            logging.exception("Failed to query torrents with hashes=%s", hashes)
+            return set()
@@ -1,6 +1,6 @@
 import argparse
 import pathlib
-from typing import List, NamedTuple, Optional
+from typing import Any, Dict, List, NamedTuple, Optional
 
 
 class ScriptEnvironment(NamedTuple):
@@ -37,6 +37,27 @@ class ScriptEnvironment(NamedTuple):
             args.torrent_id,
         )
 
+    def to_json(self) -> Dict[str, Any]:
+        """Convert to a JSON serialisable dictionary, see `from_json`."""
+        return {
+            key: str(value) if isinstance(value, pathlib.Path) else value
+            for key, value in self._asdict().items()  # pylint: disable=no-member
+        }
+
+    @classmethod
+    def from_json(cls, json_dict: Dict[str, Any]) -> "ScriptEnvironment":
+        """Recreate a `ScriptEnvironment` converted with `to_json`."""
+        return cls(
+            **{
+                key: pathlib.Path(value)
+                if key in ("content_path", "root_path", "save_path")
+                and value is not None
+                else value
+                for key, value in json_dict.items()
+                if key in cls._fields
+            }
+        )
+
 
 def parse_script_environment(env_group: argparse._ArgumentGroup) -> None:
     """Setup argparse arguments for qBittorrent scripts."""
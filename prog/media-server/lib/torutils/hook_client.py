@@ -0,0 +1,67 @@
+"""
+torrent hook service client.
+
+The torrent-added and torrent-done scripts run as a new process for every event.
+Rather than doing the work themselves they forward the event to the resident hook
+service (see [[file:hook_service.py][hook_service]]) over a unix socket and exit.
+
+This module only depends on the standard library so forwarding an event doesn't
+have to pay for importing the torrent client libraries.
+"""
+
+import json
+import logging
+import pathlib
+import socket
+from typing import Any, Dict
+
+from .backend import TorrentBackend
+
+# Events the hook service can handle.
+HOOKS = ("torrent-added", "torrent-done")
+
+# How long to wait for the hook service to accept an event in seconds.
+FORWARD_TIMEOUT = 5
+
+
+def hook_socket_file(backend: TorrentBackend) -> pathlib.Path:
+    """Socket the hook service for `backend` listens on."""
+    return backend.config_dir() / "torrent-hooks.sock"
+
+
+def forward_hook(
+    socket_file: pathlib.Path,
+    hook: str,
+    environment: Dict[str, Any],
+    watcher_config: pathlib.Path,
+    dry_run: bool,
+) -> bool:
+    """Hand the `hook` event off to the hook service listening on `socket_file`.
+
+    Returns
+    -------
+    Whether the service accepted the event. When it didn't the caller should
+    handle the event itself.
+    """
+    request = {
+        "hook": hook,
+        "environment": environment,
+        "watcher_config": str(watcher_config),
+        "dry_run": dry_run,
+    }
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(FORWARD_TIMEOUT)
+            sock.connect(str(socket_file))
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as sock_fd:
+                response = sock_fd.readline()
+    except OSError as ex:
+        logging.debug("Failed to forward hook=%s to service: %s", hook, ex)
+        return False
+
+    try:
+        return json.loads(response)["accepted"] is True
+    except (ValueError, TypeError, KeyError):
+        logging.warning("Hook service sent an invalid response=%s", response)
+        return False
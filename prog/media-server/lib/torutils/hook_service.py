@@ -0,0 +1,181 @@
+"""
+Resident torrent hook service.
+
+Handles the torrent-added and torrent-done events forwarded to it by the hook
+scripts (see [[file:hook_client.py][hook_client]]). Keeping one process around
+means the torrent client session, watcher configuration and added index are set
+up once instead of for every event, and a burst of events is handled concurrently
+in one place instead of by as many racing processes.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import pathlib
+import socket
+import sqlite3
+from typing import Dict, Optional, Set, Tuple
+
+from . import added_index, backend, hook_client, torrent_added, torrent_done, watcher
+from .environment import qbittorrent as qbit_scripts
+
+
+class HookService:
+    """Service handling torrent hook events sent over a unix socket."""
+
+    def __init__(self, torrent_backend: backend.TorrentBackend):
+        self._backend = torrent_backend
+        self._client = torrent_backend.client()
+        self._index: Optional[added_index.AddedIndex] = None
+        # Mapping from a watcher config file to its modification time and contents.
+        self._watcher_configs: Dict[
+            pathlib.Path, Tuple[int, watcher.WatcherConfig]
+        ] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _watcher_config(self, path: pathlib.Path) -> watcher.WatcherConfig:
+        """Read the watcher config at `path`, re-reading it only once it changes."""
+        mtime = path.stat().st_mtime_ns
+        cached = self._watcher_configs.get(path)
+        if cached is None or cached[0] != mtime:
+            logging.info("Reading watcher config file=%s", path)
+            cached = (mtime, watcher.WatcherConfig.from_file(path))
+            self._watcher_configs[path] = cached
+        return cached[1]
+
+    async def handle(
+        self,
+        hook: str,
+        environment: qbit_scripts.ScriptEnvironment,
+        watcher_config: pathlib.Path,
+        dry_run: bool,
+    ) -> bool:
+        """Run the `hook` event for the torrent described by `environment`."""
+        config = self._watcher_config(watcher_config)
+        if hook == "torrent-added":
+            return await torrent_added.torrent_added(
+                self._backend,
+                environment.torrent_id,
+                environment.save_path,
+                environment.tags,
+                config,
+                dry_run,
+                client=self._client,
+            )
+        if hook == "torrent-done":
+            return await torrent_done.torrent_done(
+                self._backend,
+                environment.name,
+                environment.torrent_id,
+                environment.info_hash_v1,
+                environment.save_path,
+                config,
+                dry_run,
+                environment.category is not None,
+                client=self._client,
+                index=self._index,
+            )
+        raise ValueError(f"Unknown hook={hook}")
+
+    async def _run(
+        self,
+        hook: str,
+        environment: qbit_scripts.ScriptEnvironment,
+        watcher_config: pathlib.Path,
+        dry_run: bool,
+    ) -> None:
+        logging.info("Running hook=%s for torrent=%s", hook, environment.name)
+        logging.debug(str(environment))
+        try:
+            result = await self.handle(hook, environment, watcher_config, dry_run)
+        except Exception:  # pylint: disable=broad-except
+            logging.exception(
+                "Failed to run hook=%s for torrent=%s", hook, environment.name
+            )
+            return
+        if not result:
+            logging.error("Hook=%s failed for torrent=%s", hook, environment.name)
+
+    async def _on_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Accept one hook event and reply before handling it in the background."""
+        try:
+            line = await asyncio.wait_for(
+                reader.readline(), hook_client.FORWARD_TIMEOUT
+            )
+            if not line:
+                # Just checking whether the service is up.
+                writer.close()
+                return
+            request = json.loads(line)
+            hook = request["hook"]
+            environment = qbit_scripts.ScriptEnvironment.from_json(
+                request["environment"]
+            )
+            watcher_config = pathlib.Path(request["watcher_config"])
+            dry_run = bool(request["dry_run"])
+            accepted = hook in hook_client.HOOKS
+        except (ValueError, TypeError, KeyError, asyncio.TimeoutError):
+            logging.warning("Received malformed hook request")
+            accepted = False
+
+        try:
+            writer.write(json.dumps({"accepted": accepted}).encode("utf-8") + b"\n")
+            await writer.drain()
+        except ConnectionError:
+            # The client has gone away and will handle the event itself.
+            accepted = False
+        finally:
+            writer.close()
+
+        if accepted:
+            task = asyncio.create_task(
+                self._run(hook, environment, watcher_config, dry_run)
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def serve(self, socket_file: pathlib.Path) -> bool:
+        """Listen for hook events on `socket_file` until cancelled."""
+        if _is_listening(socket_file):
+            logging.error(
+                "A hook service is already listening on socket=%s", socket_file
+            )
+            return False
+
+        try:
+            self._index = added_index.AddedIndex(
+                added_index.added_index_file(self._backend)
+            )
+        except (OSError, sqlite3.Error):
+            logging.warning("Failed to open the added index", exc_info=True)
+
+        async with self._client:
+            server = await asyncio.start_unix_server(
+                self._on_connection, path=str(socket_file)
+            )
+            os.chmod(socket_file, 0o600)
+            logging.info("Listening for hook events on socket=%s", socket_file)
+            try:
+                async with server:
+                    await server.serve_forever()
+            finally:
+                if self._tasks:
+                    logging.info("Waiting for %d running hooks", len(self._tasks))
+                    await asyncio.gather(*self._tasks, return_exceptions=True)
+                if self._index is not None:
+                    self._index.close()
+                socket_file.unlink(missing_ok=True)
+        return True
+
+
+def _is_listening(socket_file: pathlib.Path) -> bool:
+    """Assert whether something is accepting connections on `socket_file`."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_file))
+        except OSError:
+            return False
+    return True
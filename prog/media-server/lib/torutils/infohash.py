@@ -0,0 +1,131 @@
+"""
+Local torrent infohash calculation.
+
+Bittorrent daemons identify torrents by the hash of their info dictionary. Working
+this out ourselves from the .torrent file or magnet link means we don't have to ask
+the daemon which torrent it just added.
+
+The hashes returned here match the torrent ID qBittorrent uses. That's the v1 SHA-1
+infohash for v1 and hybrid torrents, and the v2 SHA-256 infohash truncated to 20
+bytes for pure v2 torrents. All hashes are lowercase hex strings.
+"""
+
+import base64
+import hashlib
+import pathlib
+import re
+import urllib.parse
+from typing import Any, Dict, Tuple
+
+# Length in hex digits of a torrent ID (a SHA-1 digest).
+_TORRENT_ID_LENGTH = 40
+
+# Multihash prefix for a 32 byte SHA-256 digest, as used in urn:btmh magnet links.
+_MULTIHASH_SHA256 = "1220"
+
+_INTEGER_REGEX = re.compile(rb"i(-?\d+)e")
+_STRING_LENGTH_REGEX = re.compile(rb"(\d+):")
+
+
+def _bdecode(data: bytes, pos: int) -> Tuple[Any, int]:
+    """Decode the bencoded value starting at `pos` in `data`.
+
+    Returns
+    -------
+    The decoded value and the position just past its end in `data`.
+    """
+    try:
+        token = data[pos : pos + 1]
+        if token == b"i":
+            match = _INTEGER_REGEX.match(data, pos)
+            if match is None:
+                raise ValueError(f"Malformed bencoded integer at offset {pos}")
+            return int(match.group(1)), match.end()
+        if token == b"l":
+            pos += 1
+            items = []
+            while data[pos : pos + 1] != b"e":
+                item, pos = _bdecode(data, pos)
+                items.append(item)
+            return items, pos + 1
+        if token == b"d":
+            pos += 1
+            items = {}
+            while data[pos : pos + 1] != b"e":
+                key, pos = _bdecode(data, pos)
+                items[key], pos = _bdecode(data, pos)
+            return items, pos + 1
+        match = _STRING_LENGTH_REGEX.match(data, pos)
+        if match is None:
+            raise ValueError(f"Malformed bencoded value at offset {pos}")
+        end = match.end() + int(match.group(1))
+        if end > len(data):
+            raise ValueError(f"Truncated bencoded string at offset {pos}")
+        return data[match.end() : end], end
+    except RecursionError as ex:
+        raise ValueError("Bencoded data is nested too deeply") from ex
+
+
+def _info_dict(data: bytes) -> Tuple[Dict[bytes, Any], bytes]:
+    """Find the info dictionary in the bencoded torrent `data`.
+
+    Returns
+    -------
+    The decoded info dictionary and the exact bytes it was encoded as.
+    """
+    if data[:1] != b"d":
+        raise ValueError("Torrent file is not a bencoded dictionary")
+    pos = 1
+    while data[pos : pos + 1] != b"e":
+        if pos >= len(data):
+            raise ValueError("Truncated torrent file")
+        key, pos = _bdecode(data, pos)
+        start = pos
+        value, pos = _bdecode(data, pos)
+        if key == b"info":
+            if not isinstance(value, dict):
+                raise ValueError("Torrent info is not a dictionary")
+            return value, data[start:pos]
+    raise ValueError("Torrent file has no info dictionary")
+
+
+def torrent_data_hash(data: bytes) -> str:
+    """Calculate the torrent ID of the bencoded torrent file contents `data`."""
+    info, encoded_info = _info_dict(data)
+    if info.get(b"meta version") == 2 and b"pieces" not in info:
+        return hashlib.sha256(encoded_info).hexdigest()[:_TORRENT_ID_LENGTH]
+    return hashlib.sha1(encoded_info).hexdigest()
+
+
+def torrent_file_hash(file: pathlib.Path) -> str:
+    """Calculate the torrent ID of the torrent file `file`."""
+    with file.open("rb") as fd:
+        return torrent_data_hash(fd.read())
+
+
+def magnetlink_hash(magnetlink: str) -> str:
+    """Extract the torrent ID from the exact topic of `magnetlink`."""
+    url = urllib.parse.urlsplit(magnetlink)
+    if url.scheme != "magnet":
+        raise ValueError(f"Not a magnet link: {magnetlink}")
+
+    v1_hash = v2_hash = None
+    for topic in urllib.parse.parse_qs(url.query).get("xt", []):
+        if topic.startswith("urn:btih:"):
+            digest = topic[len("urn:btih:") :]
+            if len(digest) == 32:
+                # Older magnet links base32 encode the hash.
+                digest = base64.b32decode(digest.upper()).hex()
+            v1_hash = digest
+        elif topic.startswith("urn:btmh:"):
+            digest = topic[len("urn:btmh:") :]
+            if digest.lower().startswith(_MULTIHASH_SHA256):
+                v2_hash = digest[len(_MULTIHASH_SHA256) :][:_TORRENT_ID_LENGTH]
+
+    # Hybrid torrents are identified by their v1 hash.
+    digest = v1_hash or v2_hash
+    if digest is None or not re.fullmatch(
+        f"[0-9a-fA-F]{{{_TORRENT_ID_LENGTH}}}", digest
+    ):
+        raise ValueError(f"Magnet link has no valid infohash: {magnetlink}")
+    return digest.lower()
@@ -11,7 +11,7 @@ configured.
 
 import logging
 import pathlib
-from typing import Any, List
+from typing import Any, List, Optional
 
 from . import backend, watcher
 
@@ -23,6 +23,7 @@ async def torrent_added(
     torrent_labels: List[str],
     watcher_config: watcher.WatcherConfig,
     dry_run: bool,
+    client: Optional[Any] = None,
 ) -> bool:
     intended_root = next(
         (
@@ -77,7 +78,7 @@ async def torrent_added(
         logging.info("Skipping actually moving file because dry-run=True")
         return True
 
-    async with torrent_backend.client() as client:
+    async with torrent_backend.connect(client) as client:
         if not await client.move(torrent_id, str(destination)):
             logging.exception(
                 "Failed to move file=%s to dest=%s", torrent_location, destination
@@ -13,9 +13,10 @@ import asyncio
 import glob
 import logging
 import pathlib
+import sqlite3
 from typing import Any, NamedTuple, Optional
 
-from . import backend, notify, watcher
+from . import added_index, backend, notify, watcher
 
 
 def _find_download_root(
@@ -47,19 +48,31 @@ class _DestPath(NamedTuple):
     added_file: Optional[pathlib.Path]
 
 
-def _calculate_dest_path(
+def _is_added_file(file: pathlib.Path, hash_: str) -> bool:
+    """Assert whether `file` is the torrent-added file for torrent `hash_`."""
+    return file.stem == hash_ and watcher.WatcherSuffixes.has_member(file.suffix)
+
+
+def _find_added_file(
     hash_: str,
     watcher_config: watcher.WatcherConfig,
-    root: pathlib.Path,
-) -> _DestPath:
-    """Determine a destination path for a completed torrent.
+    index: Optional[added_index.AddedIndex],
+) -> Optional[pathlib.Path]:
+    """Find the file torrent `hash_` was added from relative to the added directory.
 
-    Looks for a matching .magnet and .torrent file in the added torrents
-    directory and if it exists reuse the path for it relative to the added
-    directory. Otherwise place in the default completion subdirectory of
-    the current download root.def __str__(self):
+    The file is looked up in `index` first. If it isn't recorded there (or has
+    since been moved) the added directory is searched for it and the index is
+    updated with what was found.
     """
-    default = root / watcher_config.complete_subdir
+    if index is not None:
+        file_relative = index.get(hash_)
+        if (
+            file_relative is not None
+            and _is_added_file(file_relative, hash_)
+            and (watcher_config.added_dir / file_relative).exists()
+        ):
+            return file_relative
+        logging.debug("No indexed src file for torrent with hash=%s", hash_)
 
     # We glob for any file prefixes with the torrent hash and then
     # filter out files with unexpected file-names or invalid suffixes
@@ -70,17 +83,53 @@ def _calculate_dest_path(
     )
     for file_relative_ in files_with_hash:
         file_relative = pathlib.Path(file_relative_)
-        file = watcher_config.added_dir / file_relative
-        if file.stem == hash_ and watcher.WatcherSuffixes.has_member(file.suffix):
-            logging.info("Found src file=%s for torrent with hash=%s", file, hash_)
-            # As a special case to avoid cluttering the main download directory we
-            # push any files that would ordinarily be put in this directory into
-            # the default complete directory.
-            if str(file_relative.parent) == ".":
-                return _DestPath(default, file)
-            return _DestPath(root / file_relative.parent, file)
+        if _is_added_file(file_relative, hash_):
+            if index is not None:
+                index.update([(hash_, file_relative)])
+            return file_relative
+    return None
+
+
+def _calculate_dest_path(
+    hash_: str,
+    watcher_config: watcher.WatcherConfig,
+    root: pathlib.Path,
+    index: Optional[added_index.AddedIndex],
+) -> _DestPath:
+    """Determine a destination path for a completed torrent.
+
+    Looks for a matching .magnet and .torrent file in the added torrents
+    directory and if it exists reuse the path for it relative to the added
+    directory. Otherwise place in the default completion subdirectory of
+    the current download root.
+    """
+    default = root / watcher_config.complete_subdir
+
+    file_relative = _find_added_file(hash_, watcher_config, index)
+    if file_relative is None:
+        return _DestPath(default, None)
+
+    file = watcher_config.added_dir / file_relative
+    logging.info("Found src file=%s for torrent with hash=%s", file, hash_)
+    # As a special case to avoid cluttering the main download directory we
+    # push any files that would ordinarily be put in this directory into
+    # the default complete directory.
+    if str(file_relative.parent) == ".":
+        return _DestPath(default, file)
+    return _DestPath(root / file_relative.parent, file)
 
-    return _DestPath(default, None)
+
+def _open_added_index(
+    torrent_backend: backend.TorrentBackend,
+) -> Optional[added_index.AddedIndex]:
+    try:
+        return added_index.AddedIndex(added_index.added_index_file(torrent_backend))
+    except (OSError, sqlite3.Error):
+        logging.warning(
+            "Failed to open the added index, searching for src files directly",
+            exc_info=True,
+        )
+        return None
 
 
 # pylint: disable=too-many-return-statements
@@ -92,6 +141,8 @@ async def _move_completed_torrent(
     watcher_config: watcher.WatcherConfig,
     dry_run: bool,
     skip_move: bool,
+    index: Optional[added_index.AddedIndex],
+    client: Optional[Any],
 ) -> bool:
     """Move a just completed torrent into a completed download directory."""
     if not location.exists():
@@ -113,7 +164,7 @@ async def _move_completed_torrent(
         return True
 
     logging.debug("Determining destination for file=%s", location)
-    destination, added_file = _calculate_dest_path(hash_, watcher_config, root)
+    destination, added_file = _calculate_dest_path(hash_, watcher_config, root, index)
     if destination == location:
         logging.warning(
             "Not moving file=%s to dest=%s because their the same",
@@ -132,7 +183,7 @@ async def _move_completed_torrent(
             logging.info("Skipping actually moving file because dry-run=True")
             return True
 
-        async with torrent_backend.client() as client:
+        async with torrent_backend.connect(client) as client:
             if not await client.move(id_, str(destination)):
                 logging.exception(
                     "Failed to move file=%s to dest=%s", location, destination
@@ -145,12 +196,16 @@ async def _move_completed_torrent(
                         "Moving source file=%s to dest=%s", added_file, new_added_file
                     )
                     added_file.rename(new_added_file)
+                    if index is not None:
+                        index.remove(hash_)
                 return False
 
     # If the torrent was moved sucesfully, we no longer have any need for
     # the watch file the torrent was added with so it can be removed.
     if added_file is not None:
         added_file.unlink()
+        if index is not None:
+            index.remove(hash_)
 
     return True
 
@@ -164,7 +219,12 @@ async def torrent_done(
     watcher_config: watcher.WatcherConfig,
     dry_run: bool,
     skip_move: bool = False,
+    client: Optional[Any] = None,
+    index: Optional[added_index.AddedIndex] = None,
 ) -> bool:
+    own_index = index is None
+    if own_index:
+        index = _open_added_index(torrent_backend)
     tasks = []
     tasks.append(notify.notify_complete(torrent_backend, torrent_name))
     tasks.append(
@@ -176,11 +236,17 @@ async def torrent_done(
             watcher_config,
             dry_run,
             skip_move,
+            index,
+            client,
         )
     )
 
     result = True
-    task_results = await asyncio.gather(*tasks, return_exceptions=True)
+    try:
+        task_results = await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        if own_index and index is not None:
+            index.close()
     for task_result in task_results:
         if isinstance(task_result, Exception):
             logging.exception(